@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Append-only history of backup runs and ETA prediction from it.
+
+Every source attempt, BK1 mirror and runner invocation is appended as one
+compact JSON line to the history file:
+
+    {"type":"source","run":...,"name":"laptop","start":...,"end":...,"bytes":...,"files":...,"exit":0}
+    {"type":"bk1","run":...,"start":...,"end":...,"exit":0}
+    {"type":"run","run":...,"start":...,"end":...,"exit":0}
+
+'run' is the start time of the checkpointed run, shared by resumed invocations.
+
+    python3 backup_history.py runs
+    python3 backup_history.py eta
+"""
+import os
+import json
+import fcntl
+import time
+import argparse
+from datetime import datetime
+from statistics import median
+
+# Number of past successful runs the estimator looks at
+RECENT_RUNS = 10
+
+def append_record(path, record):
+    """Append one record as a single line; a line is the unit of durability."""
+    line = json.dumps(record, separators=(',', ':')) + "\n"
+    with open(path, 'a') as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_history(path):
+    """Return all records, skipping a torn last line left by a crash."""
+    records = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+def recent(records, record_type, name=None, limit=RECENT_RUNS):
+    """Last successful records of a type (and source name), oldest first."""
+    matches = [r for r in records
+               if r.get('type') == record_type and r.get('exit') in (0, 24)
+               and (name is None or r.get('name') == name)]
+    return matches[-limit:]
+
+def estimate_source(history, name, entry, now):
+    """Seconds left for one source, or None if it has never completed before."""
+    # Failed sources are not retried again in this run
+    if entry['state'] in ('done', 'failed'):
+        return 0.0
+    past = recent(history, 'source', name)
+    if not past:
+        return None
+    durations = [r['end'] - r['start'] for r in past]
+    if entry['state'] != 'running':
+        return median(durations)
+
+    elapsed = now - entry.get('started', now)
+    expected_bytes = median(r.get('bytes', 0) for r in past)
+    live_bytes = entry.get('bytes', 0)
+    if expected_bytes <= 0:
+        return max(median(durations) - elapsed, 0.0)
+    # Once bytes are flowing, tonight's rate beats the historical one
+    if elapsed > 60 and live_bytes > 0:
+        rate = live_bytes / elapsed
+    else:
+        rate = median(r.get('bytes', 0) / max(r['end'] - r['start'], 1) for r in past)
+    if rate <= 0:
+        return max(median(durations) - elapsed, 0.0)
+    return max(expected_bytes - live_bytes, 0) / rate
+
+def estimate_remaining(history, checkpoint, now=None):
+    """Seconds until the checkpointed run finishes, or None if nothing is known about it."""
+    now = now or time.time()
+    remaining = 0.0
+    known = False
+    for name, entry in checkpoint.get('sources', {}).items():
+        estimate = estimate_source(history, name, entry, now)
+        if estimate is not None:
+            remaining += estimate
+            known = True
+
+    bk1 = recent(history, 'bk1')
+    last_run = next((r['run'] for r in reversed(history) if r.get('type') == 'run'), None)
+    # Only count the mirror if it is running or the last run did one; cron runs skip it
+    if bk1 and ('bk1_started' in checkpoint or bk1[-1]['run'] == last_run):
+        bk1_duration = median(r['end'] - r['start'] for r in bk1)
+        if 'bk1_started' in checkpoint:
+            bk1_duration = max(bk1_duration - (now - checkpoint['bk1_started']), 0.0)
+        remaining += bk1_duration
+        known = True
+    return remaining if known else None
+
+def format_duration(seconds):
+    minutes, _ = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}"
+
+def format_bytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024:
+            return f"{count:.0f} {unit}"
+        count /= 1024
+    return f"{count:.1f} TB"
+
+def show_runs(history, limit):
+    """Print the last runs with per-source and BK1 durations."""
+    by_run = {}
+    for record in history:
+        by_run.setdefault(record.get('run'), []).append(record)
+    for run_id in sorted(by_run)[-limit:]:
+        records = by_run[run_id]
+        start = min(r['start'] for r in records)
+        end = max(r['end'] for r in records)
+        exit_code = next((r['exit'] for r in reversed(records) if r['type'] == 'run'), None)
+        print(f"{datetime.fromtimestamp(run_id):%Y-%m-%d %H:%M}  "
+              f"{format_duration(end - start):>6}  exit {exit_code}")
+        for r in records:
+            if r['type'] == 'source':
+                print(f"    {r['name']:<16}{format_duration(r['end'] - r['start']):>6}"
+                      f"{format_bytes(r.get('bytes', 0)):>12}{r.get('files', 0):>9} files  exit {r['exit']}")
+            elif r['type'] == 'bk1':
+                print(f"    {'BK1 mirror':<16}{format_duration(r['end'] - r['start']):>6}"
+                      f"{'':>28}exit {r['exit']}")
+
+def runner_alive(checkpoint_path):
+    """True if a runner holds the checkpoint lock, so the checkpoint is live.
+
+    Testing the lock rather than a stored pid cannot be fooled by pid reuse.
+    """
+    try:
+        with open(checkpoint_path + ".lock", 'r') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    return False
+
+def show_eta(history, checkpoint_path):
+    """Print the predicted finish time of the running backup."""
+    try:
+        with open(checkpoint_path, 'r') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        print("No backup checkpoint found")
+        return
+    if not runner_alive(checkpoint_path):
+        print("No backup running")
+        return
+    remaining = estimate_remaining(history, checkpoint)
+    if remaining is None:
+        print("Backup running, no history to estimate from yet")
+        return
+    finish = datetime.fromtimestamp(time.time() + remaining)
+    print(f"ETA {finish:%H:%M} ({format_duration(remaining)} remaining)")
+
+def main():
+    # Imported here: backup_runner imports this module
+    from backup_runner import SCRIPT_DIR, load_config
+
+    parser = argparse.ArgumentParser(description="Show SnapSync backup history and ETA")
+    parser.add_argument("command", choices=("runs", "eta"))
+    parser.add_argument("--config", default=os.path.join(SCRIPT_DIR, "backup_config.json"))
+    parser.add_argument("-n", type=int, default=10, help="Number of runs to show")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    history = load_history(config['history_file'])
+    if args.command == "runs":
+        show_runs(history, args.n)
+    else:
+        show_eta(history, config['checkpoint_file'])
+
+if __name__ == "__main__":
+    main()
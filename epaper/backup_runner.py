@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import fcntl
+import signal
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from io_governor import create_governor
+from backup_history import append_record, load_history, estimate_remaining
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RSYNC_OPTS = ["-aAXv", "--delete", "--numeric-ids"]
+# Overall progress and a summary at the end, parsed for the run history and ETA
+RSYNC_REPORT_OPTS = ["--info=progress2", "--stats"]
+RSYNC_EXCLUDES = ['/dev/*', '/proc/*', '/sys/*', '/tmp/*', '/run/*', '/mnt/*', '/media/*', '/lost+found']
+
+# Option sets a source can pick with 'rsync_profile' in backup_config.json.
+# bench_rsync.py measures them and recommends one per source.
+RSYNC_PROFILES = {
+    'default': {'rsync': [], 'ssh': []},
+    'whole-file': {'rsync': ['--whole-file'], 'ssh': []},
+    'zstd-1': {'rsync': ['--compress', '--compress-choice=zstd', '--compress-level=1'], 'ssh': []},
+    'zstd-6': {'rsync': ['--compress', '--compress-choice=zstd', '--compress-level=6'], 'ssh': []},
+    'zlib-6': {'rsync': ['--compress', '--compress-choice=zlib', '--compress-level=6'], 'ssh': []},
+    'xxh128': {'rsync': ['--checksum-choice=xxh128'], 'ssh': []},
+    'md5': {'rsync': ['--checksum-choice=md5'], 'ssh': []},
+    'aes128-gcm': {'rsync': [], 'ssh': ['-c', 'aes128-gcm@openssh.com']},
+    'chacha20': {'rsync': [], 'ssh': ['-c', 'chacha20-poly1305@openssh.com']},
+    'whole-file-aes128-gcm': {'rsync': ['--whole-file'], 'ssh': ['-c', 'aes128-gcm@openssh.com']},
+}
+
+# Interrupted files are kept here (relative to the destination) so a rerun
+# resumes them instead of starting the transfer over.
+PARTIAL_DIR = ".rsync-partial"
+
+# rsync exit code 24 means some source files vanished mid-transfer, which is
+# normal when backing up a live system.
+RSYNC_OK_CODES = (0, 24)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULTS = {
+    'max_retries': 3,
+    'retry_delay': 60,
+    'retry_delay_max': 900,
+    'run_window_hours': 20,
+}
+
+# How often live progress is written to the checkpoint and ETA to the status file
+PROGRESS_SAVE_INTERVAL = 5
+STATUS_UPDATE_INTERVAL = 30
+
+PROGRESS_LINE = re.compile(r"^\s*([\d,]+)\s+\d+%")
+STATS_FILES = re.compile(r"^Number of (?:regular )?files transferred: ([\d,]+)")
+STATS_BYTES = re.compile(r"^Total transferred file size: ([\d,]+)")
+
+def normalize_sources(backup_sources):
+    """Return backup sources as a list of dicts, whichever format the config uses."""
+    if isinstance(backup_sources, dict):
+        sources = [dict(source, name=name) for name, source in backup_sources.items()]
+    else:
+        sources = [dict(source) for source in backup_sources]
+    for source in sources:
+        source.setdefault('port', '22')
+        source.setdefault('backup_dir', source['name'])
+    return sources
+
+def load_config(path):
+    """Load backup_config.json and fill in defaults."""
+    with open(path, 'r') as f:
+        config = json.load(f)
+    for key, value in DEFAULTS.items():
+        config.setdefault(key, value)
+    config['backup_sources'] = normalize_sources(config['backup_sources'])
+    for source in config['backup_sources']:
+        if source.get('rsync_profile', 'default') not in RSYNC_PROFILES:
+            raise ValueError(f"Unknown rsync_profile '{source['rsync_profile']}' for {source['name']}")
+    status_dir = os.path.dirname(config['status_file'])
+    config.setdefault('checkpoint_file', os.path.join(status_dir, "backup_checkpoint.json"))
+    config.setdefault('history_file', os.path.join(status_dir, "backup_history.jsonl"))
+    return config
+
+def update_status(config, message):
+    """Write a single timestamped line to the status file shown on the panel."""
+    with open(config['status_file'], 'w') as f:
+        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+
+def save_checkpoint(path, checkpoint):
+    """Atomically write the checkpoint so a crash never leaves it half-written."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def acquire_lock(config):
+    """Lock the checkpoint so two runners (cron and a manual backup.sh) never sync at once.
+
+    Returns the open lock file, held until the process exits, or None if another runner has it.
+    """
+    lock_file = open(config['checkpoint_file'] + ".lock", 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def load_checkpoint(config, fresh=False):
+    """Resume the checkpoint of the current run window, or start a new one."""
+    now = time.time()
+    checkpoint = None
+    if not fresh:
+        try:
+            with open(config['checkpoint_file'], 'r') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            checkpoint = None
+
+    if checkpoint and now - checkpoint.get('run_started', 0) < config['run_window_hours'] * 3600:
+        print(f"Resuming run started {datetime.fromtimestamp(checkpoint['run_started'])}")
+    else:
+        checkpoint = {'run_started': now, 'sources': {}}
+
+    checkpoint.pop('bk1_started', None)
+
+    # Sources removed from the config since the run started are no longer part of it
+    names = {source['name'] for source in config['backup_sources']}
+    checkpoint['sources'] = {name: entry for name, entry in checkpoint['sources'].items()
+                             if name in names}
+    for source in config['backup_sources']:
+        entry = checkpoint['sources'].setdefault(source['name'], {'state': PENDING, 'attempts': 0})
+        # Anything not finished in a previous attempt gets another go
+        if entry['state'] != DONE:
+            entry['state'] = PENDING
+            entry['attempts'] = 0
+    return checkpoint
+
+def set_state(config, checkpoint, name, state, **extra):
+    """Record a source state transition and persist it."""
+    entry = checkpoint['sources'][name]
+    entry['state'] = state
+    entry['updated'] = time.time()
+    entry.update(extra)
+    save_checkpoint(config['checkpoint_file'], checkpoint)
+
+def build_rsync_command(config, source):
+    """Build the rsync command line for a single source."""
+    profile = RSYNC_PROFILES[source.get('rsync_profile', 'default')]
+    cmd = ["rsync"] + RSYNC_OPTS + RSYNC_REPORT_OPTS + profile['rsync'] + [f"--partial-dir={PARTIAL_DIR}"]
+    if config.get('bwlimit'):
+        cmd.append(f"--bwlimit={config['bwlimit']}")
+    cmd += [f"--exclude={pattern}" for pattern in RSYNC_EXCLUDES]
+    cmd += ["-e", " ".join(["ssh", "-p", str(source['port'])] + profile['ssh'])]
+    cmd.append("--rsync-path=sudo rsync")
+    cmd.append(f"{source['user']}@{source['host']}:{source['path']}")
+    cmd.append(os.path.join(config['bk0_path'], source['backup_dir'], ""))
+    return cmd
+
+def iter_output(stream):
+    """Yield output lines, splitting on the carriage returns rsync progress updates use."""
+    buffer = b""
+    while True:
+        chunk = stream.read1(65536)
+        if not chunk:
+            break
+        *lines, buffer = re.split(rb"[\r\n]", buffer + chunk)
+        for line in lines:
+            if line:
+                yield line.decode(errors='replace')
+    if buffer:
+        yield buffer.decode(errors='replace')
+
+def parse_count(text):
+    return int(text.replace(",", ""))
+
+def run_transfer(cmd, governor, on_output=None):
+    """Run a transfer under the I/O governor (if any) and return its exit code.
+
+    With on_output, stdout is captured and handed over line by line instead.
+    """
+    # Own session so the governor can stop/continue rsync together with its ssh child
+    proc = subprocess.Popen(cmd, start_new_session=True,
+                            stdout=subprocess.PIPE if on_output else None)
+    if governor:
+        governor.register(proc)
+    try:
+        if on_output:
+            for line in iter_output(proc.stdout):
+                on_output(line)
+        return proc.wait()
+    finally:
+        if governor:
+            governor.unregister(proc)
+        if proc.poll() is None:
+            proc.terminate()
+            # In case the transfer was stopped, so it can act on SIGTERM
+            try:
+                os.killpg(proc.pid, signal.SIGCONT)
+            except ProcessLookupError:
+                pass
+            proc.wait()
+        if proc.stdout:
+            proc.stdout.close()
+
+def update_eta_status(config, checkpoint, history, label):
+    """Show the predicted finish time on the panel's status line."""
+    remaining = estimate_remaining(history, checkpoint)
+    if remaining is None:
+        update_status(config, f"Backing up {label}")
+    else:
+        update_status(config, f"{label} ETA {datetime.fromtimestamp(time.time() + remaining):%H:%M}")
+
+def transfer_source(config, checkpoint, source, history, governor):
+    """Run one rsync attempt, tracking live progress. Returns (exit code, stats)."""
+    entry = checkpoint['sources'][source['name']]
+    stats = {'bytes': 0, 'files': 0}
+    last_save = last_status = time.monotonic()
+
+    def on_output(line):
+        nonlocal last_save, last_status
+        progress = PROGRESS_LINE.match(line)
+        if not progress:
+            print(line)
+            for key, pattern in (('files', STATS_FILES), ('bytes', STATS_BYTES)):
+                match = pattern.match(line)
+                if match:
+                    stats[key] = parse_count(match.group(1))
+            return
+        entry['bytes'] = parse_count(progress.group(1))
+        now = time.monotonic()
+        if now - last_save >= PROGRESS_SAVE_INTERVAL:
+            save_checkpoint(config['checkpoint_file'], checkpoint)
+            last_save = now
+        if now - last_status >= STATUS_UPDATE_INTERVAL:
+            update_eta_status(config, checkpoint, history, source['name'])
+            last_status = now
+
+    returncode = run_transfer(build_rsync_command(config, source), governor, on_output)
+    return returncode, stats
+
+def backup_source(config, checkpoint, source, history, governor=None):
+    """Make one backup attempt of a source. Returns True on success."""
+    name = source['name']
+    entry = checkpoint['sources'][name]
+    entry['attempts'] += 1
+    started = time.time()
+    set_state(config, checkpoint, name, RUNNING, started=started, bytes=0)
+    print(f"Backing up {name} (attempt {entry['attempts']})...")
+    update_eta_status(config, checkpoint, history, name)
+
+    returncode, stats = transfer_source(config, checkpoint, source, history, governor)
+    record = {'type': 'source', 'run': checkpoint['run_started'], 'name': name,
+              'start': started, 'end': time.time(), 'exit': returncode}
+    record.update(stats)
+    append_record(config['history_file'], record)
+    history.append(record)
+
+    if returncode in RSYNC_OK_CODES:
+        set_state(config, checkpoint, name, DONE, exit_code=returncode)
+        return True
+
+    print(f"{name} backup failed with exit code {returncode}")
+    state = FAILED if entry['attempts'] > config['max_retries'] else PENDING
+    set_state(config, checkpoint, name, state, exit_code=returncode)
+    return False
+
+def backup_all_sources(config, checkpoint, history, governor=None):
+    """Back up every pending source, then retry failures in rounds with exponential backoff.
+
+    Each round goes over all sources first, so one offline host does not hold up
+    the healthy ones. Returns the names of the sources that failed for good.
+    """
+    pending = []
+    for source in config['backup_sources']:
+        if checkpoint['sources'][source['name']]['state'] == DONE:
+            print(f"Skipping {source['name']}, already done in this run")
+        else:
+            pending.append(source)
+
+    delay = config['retry_delay']
+    while True:
+        for source in pending:
+            backup_source(config, checkpoint, source, history, governor)
+        pending = [source for source in pending
+                   if checkpoint['sources'][source['name']]['state'] == PENDING]
+        if not pending:
+            break
+        names = ', '.join(source['name'] for source in pending)
+        print(f"Retrying {names} in {delay}s...")
+        update_status(config, f"{names} retry in {delay}s")
+        time.sleep(delay)
+        delay = min(delay * 2, config['retry_delay_max'])
+
+    return [source['name'] for source in config['backup_sources']
+            if checkpoint['sources'][source['name']]['state'] == FAILED]
+
+def confirm_bk1():
+    """Ask whether to mirror BK0 to BK1; non-interactive runs (cron) skip it."""
+    try:
+        return input("Update BK1? [y/N]: ").strip().lower() == 'y'
+    except EOFError:
+        return False
+
+def mirror_bk1(config, checkpoint, history, governor=None):
+    """Mirror BK0 to BK1, keeping BK1 read-only outside the sync."""
+    started = time.time()
+    checkpoint['bk1_started'] = started
+    save_checkpoint(config['checkpoint_file'], checkpoint)
+    update_eta_status(config, checkpoint, history, "BK1")
+
+    print("Remounting BK1 rw...")
+    subprocess.run(["sudo", "mount", "-o", "remount,rw", config['bk1_path']])
+    try:
+        print("Syncing BK0 → BK1...")
+        returncode = run_transfer(["rsync", "-av", "--delete",
+                                   os.path.join(config['bk0_path'], ""),
+                                   os.path.join(config['bk1_path'], "")], governor)
+    finally:
+        print("Remounting BK1 ro...")
+        subprocess.run(["sudo", "mount", "-o", "remount,ro", config['bk1_path']])
+
+    append_record(config['history_file'], {'type': 'bk1', 'run': checkpoint['run_started'],
+                                           'start': started, 'end': time.time(), 'exit': returncode})
+    checkpoint.pop('bk1_started')
+    save_checkpoint(config['checkpoint_file'], checkpoint)
+
+    if returncode == 0:
+        print("BK1 done")
+        update_status(config, "BK1 done")
+    else:
+        print("BK1 failed!")
+        update_status(config, "BK1 failed")
+    return returncode
+
+def exit_on_signal(signum, frame):
+    # Unwind through the finally blocks so the transfer (in its own session) is stopped too
+    raise SystemExit(128 + signum)
+
+def run_backup(config, fresh=False):
+    """Back up every source not yet done in this run window, then optionally mirror to BK1."""
+    for signum in (signal.SIGTERM, signal.SIGHUP):
+        signal.signal(signum, exit_on_signal)
+
+    lock = acquire_lock(config)
+    if lock is None:
+        print("Another backup is already running, exiting")
+        return 1
+
+    started = time.time()
+    checkpoint = load_checkpoint(config, fresh)
+    save_checkpoint(config['checkpoint_file'], checkpoint)
+    update_status(config, "Starting backup")
+    history = load_history(config['history_file'])
+
+    governor = create_governor(config)
+    returncode = 1
+    try:
+        failed = backup_all_sources(config, checkpoint, history, governor)
+
+        if failed:
+            # Leave BK1 untouched so it still holds the last complete mirror
+            print(f"Backup failed for: {', '.join(failed)}")
+            update_status(config, f"{', '.join(failed)} failed")
+            return returncode
+
+        update_status(config, "BK0 done")
+
+        if confirm_bk1():
+            mirror_bk1(config, checkpoint, history, governor)
+        else:
+            print("BK1 skipped")
+        returncode = 0
+    finally:
+        if governor:
+            governor.stop()
+        append_record(config['history_file'], {'type': 'run', 'run': checkpoint['run_started'],
+                                               'start': started, 'end': time.time(), 'exit': returncode})
+
+    update_status(config, "Backup done")
+    return returncode
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a resumable SnapSync backup")
+    parser.add_argument("--config", default=os.path.join(SCRIPT_DIR, "backup_config.json"),
+                        help="Path to backup_config.json")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore the checkpoint and back up every source again")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    sys.exit(run_backup(config, args.fresh))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Synthetic benchmark: foreground write latency during a bulk copy, with and without the I/O governor.
+
+Run it against the disk the backups land on, e.g.:
+    python3 bench_io_governor.py --dir /mnt/nvme0/tmp --duration 30
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import subprocess
+from io_governor import IOGovernor, resolve_devices, set_priority, NORMAL_IOPRIO, TRANSFER_NICE
+
+# Bulk writer standing in for rsync: streams 1 MiB blocks, fsyncing every 16 MiB,
+# and reports the bytes it wrote when terminated.
+WRITER = """
+import os, sys, signal
+path, size = sys.argv[1], int(sys.argv[2])
+written = 0
+def done(*_):
+    print(written)
+    sys.exit(0)
+signal.signal(signal.SIGTERM, done)
+block = os.urandom(1 << 20)
+with open(path, 'wb') as f:
+    while True:
+        f.write(block)
+        written += len(block)
+        if written % (16 << 20) == 0:
+            f.flush()
+            os.fsync(f.fileno())
+        if f.tell() >= size:
+            f.seek(0)
+"""
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def probe_latency(path, duration, interval=0.05):
+    """Time small synchronous writes, like a foreground service logging to disk."""
+    samples = []
+    payload = b"x" * 4096
+    deadline = time.monotonic() + duration
+    with open(path, 'wb') as f:
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            samples.append((time.monotonic() - start) * 1000)
+            time.sleep(interval)
+    return samples
+
+def run_scenario(args, governed):
+    writer_path = os.path.join(args.dir, "bench_writer.bin")
+    probe_path = os.path.join(args.dir, "bench_probe.bin")
+    writer = subprocess.Popen([sys.executable, "-c", WRITER, writer_path, str(args.size << 20)],
+                              stdout=subprocess.PIPE, start_new_session=True)
+    governor = None
+    if governed:
+        governor = IOGovernor(resolve_devices([args.dir]), target_latency_ms=args.target_latency,
+                              target_pressure=args.target_pressure)
+        governor.start()
+        governor.register(writer)
+    else:
+        # Same priority register() gives a transfer, so only the governor differs
+        set_priority(writer.pid, NORMAL_IOPRIO, TRANSFER_NICE)
+    try:
+        samples = probe_latency(probe_path, args.duration)
+    finally:
+        if governor:
+            governor.unregister(writer)
+            governor.stop()
+        writer.send_signal(signal.SIGTERM)
+        written = int(writer.communicate()[0] or 0)
+        for path in (writer_path, probe_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return samples, written / (1 << 20) / args.duration
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default="/mnt/nvme0", help="Directory on the disk to test")
+    parser.add_argument("--duration", type=int, default=30, help="Seconds per scenario")
+    parser.add_argument("--size", type=int, default=1024, help="Bulk writer file size in MiB")
+    parser.add_argument("--target-latency", type=float, default=20, help="Governor latency target (ms)")
+    parser.add_argument("--target-pressure", type=float, default=10, help="Governor PSI target (%%)")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'bulk MB/s':>11}")
+    for name, governed in (("baseline", False), ("governed", True)):
+        samples, throughput = run_scenario(args, governed)
+        print(f"{name:<12}{percentile(samples, 50):>9.1f}{percentile(samples, 95):>9.1f}"
+              f"{percentile(samples, 99):>9.1f}{max(samples):>9.1f}{throughput:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Benchmark rsync option profiles on synthetic trees and recommend one per source.
+
+Each tree shape (many small files, few huge files, mixed) is copied cold into an
+empty destination, then synced again after changing ~10% of it, like a nightly
+run. Every profile runs over the same transport: ssh to localhost when that
+works, as in production, otherwise a loopback remote shell so rsync still runs
+its real client/server protocol (ssh cipher profiles are skipped then).
+
+    python3 bench_rsync.py --workdir /mnt/nvme0/bench --size 512
+    python3 bench_rsync.py --workdir /mnt/nvme0/bench --save laptop=mixed
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import subprocess
+from backup_runner import (SCRIPT_DIR, RSYNC_OPTS, RSYNC_PROFILES, STATS_FILES, STATS_BYTES,
+                           parse_count)
+
+# Stand-in for ssh: drop the host argument and run the command through a
+# local shell, the way sshd would run it on the remote end.
+LOOPBACK_RSH = """#!/bin/sh
+shift
+exec sh -c "$*"
+"""
+
+SHAPES = ('small', 'huge', 'mixed')
+
+def make_data(size):
+    """Roughly 2:1 compressible bytes, so compression profiles have something to win."""
+    data = bytearray()
+    while len(data) < size:
+        chunk = os.urandom(2048)
+        data += chunk + chunk
+    return bytes(data[:size])
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def build_tree(root, shape, size_mb, seed=0):
+    """Create a synthetic source tree of about size_mb MiB."""
+    rng = random.Random(seed)
+    budget = size_mb << 20
+    if shape in ('small', 'mixed'):
+        small_budget = budget if shape == 'small' else budget // 4
+        written = 0
+        i = 0
+        while written < small_budget:
+            size = rng.randint(1, 16) << 10
+            write_file(os.path.join(root, f"d{i // 200:03d}", f"f{i:06d}.dat"), make_data(size))
+            written += size
+            i += 1
+        budget -= written
+    if shape in ('huge', 'mixed'):
+        count = 4 if shape == 'huge' else 2
+        for i in range(count):
+            write_file(os.path.join(root, "big", f"huge{i}.bin"), make_data(budget // count))
+
+def mutate_tree(root, seed=1):
+    """Change ~10% of the bytes: 10 of every 100 blocks of big files, every 10th small file whole."""
+    rng = random.Random(seed)
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            size = os.path.getsize(path)
+            if size >= (1 << 20):
+                block = size // 100
+                with open(path, 'r+b') as f:
+                    for slot in rng.sample(range(100), 10):
+                        f.seek(slot * block)
+                        f.write(make_data(block))
+            elif rng.random() < 0.1:
+                write_file(path, make_data(size))
+
+def ssh_available():
+    """True if passwordless ssh to localhost works, so cipher profiles can be measured."""
+    try:
+        return subprocess.run(["ssh", "-o", "BatchMode=yes", "-o", "ConnectTimeout=3",
+                               "localhost", "true"], capture_output=True).returncode == 0
+    except OSError:
+        return False
+
+def rsync_command(profile, src, dest, rsh):
+    cmd = ["rsync"] + RSYNC_OPTS + ["--stats"] + profile['rsync']
+    cmd += ["-e", " ".join([rsh] + profile['ssh'])]
+    return cmd + [os.path.join(src, ""), f"localhost:{os.path.join(dest, '')}"]
+
+def timed_rsync(cmd):
+    """Run rsync, returning (wall s, child CPU s, files, bytes transferred), or None if it failed."""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.monotonic()
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    wall = time.monotonic() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    if result.returncode != 0:
+        print(f"  ! {' '.join(cmd)}: {result.stderr.decode(errors='replace').strip()}")
+        return None
+    # What --stats reports as transferred, the same figures the runner records in its history
+    stats = {STATS_FILES: 0, STATS_BYTES: 0}
+    for line in result.stdout.decode(errors='replace').splitlines():
+        for pattern in stats:
+            match = pattern.match(line)
+            if match:
+                stats[pattern] = parse_count(match.group(1))
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return wall, cpu, stats[STATS_FILES], stats[STATS_BYTES]
+
+def bench_shape(workdir, shape, size_mb, profiles, rsh):
+    """Run every profile cold and incremental on one shape. Returns {profile: results}."""
+    base = os.path.join(workdir, f"src-{shape}")
+    changed = os.path.join(workdir, f"src-{shape}-changed")
+    if not os.path.exists(base):
+        print(f"Building {shape} tree ({size_mb} MiB)...")
+        build_tree(base, shape, size_mb)
+        shutil.copytree(base, changed, symlinks=True)
+        mutate_tree(changed)
+    results = {}
+    for name in profiles:
+        dest = os.path.join(workdir, f"dst-{shape}-{name}")
+        shutil.rmtree(dest, ignore_errors=True)
+        passes = {}
+        for pass_name, src in (("cold", base), ("incremental", changed)):
+            timing = timed_rsync(rsync_command(RSYNC_PROFILES[name], src, dest, rsh))
+            if timing is None:
+                break
+            wall, cpu, files, transferred = timing
+            # Rates count only what was transferred, not the unchanged rest of the tree
+            passes[pass_name] = {
+                'wall': wall,
+                'cpu': cpu,
+                'mb_s': transferred / (1 << 20) / wall,
+                'files_s': files / wall,
+            }
+            print(f"{shape:<7}{name:<24}{pass_name:<13}{passes[pass_name]['mb_s']:>9.1f}"
+                  f"{passes[pass_name]['files_s']:>10.0f}{cpu:>8.2f}{wall:>8.2f}")
+        shutil.rmtree(dest, ignore_errors=True)
+        if len(passes) == 2:
+            results[name] = passes
+    return results
+
+def recommend(results):
+    """Pick the profile with the fastest incremental pass (what nightly runs do), then least CPU."""
+    return min(results, key=lambda name: (round(results[name]['incremental']['wall'], 1),
+                                          results[name]['incremental']['cpu']))
+
+def save_profile(config_path, source_name, profile):
+    """Store a source's rsync_profile in backup_config.json, keeping its source format."""
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    sources = config['backup_sources']
+    if isinstance(sources, dict):
+        source = sources.get(source_name)
+    else:
+        source = next((s for s in sources if s.get('name') == source_name), None)
+    if source is None:
+        print(f"! No source named '{source_name}' in {config_path}")
+        return
+    source['rsync_profile'] = profile
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=4)
+    print(f"✓ {source_name} now uses rsync profile '{profile}'")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workdir", required=True, help="Scratch directory, ideally on BK0")
+    parser.add_argument("--size", type=int, default=512, help="Size of each synthetic tree in MiB")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--profiles", nargs="+", choices=sorted(RSYNC_PROFILES),
+                        help="Profiles to measure (default: all that can run here)")
+    parser.add_argument("--save", action="append", default=[], metavar="SOURCE=SHAPE",
+                        help="Save the profile recommended for SHAPE to SOURCE in backup_config.json")
+    parser.add_argument("--config", default=os.path.join(SCRIPT_DIR, "backup_config.json"))
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic trees for the next run")
+    args = parser.parse_args()
+
+    if shutil.which("rsync") is None:
+        print("rsync is not installed")
+        sys.exit(1)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    profiles = args.profiles or sorted(RSYNC_PROFILES)
+    loopback = None
+    if ssh_available():
+        rsh = "ssh -o BatchMode=yes"
+    else:
+        # Cipher profiles cannot be compared fairly against an unencrypted transport
+        skipped = [name for name in profiles if RSYNC_PROFILES[name]['ssh']]
+        if skipped:
+            print(f"No passwordless ssh to localhost, skipping: {', '.join(skipped)}")
+        profiles = [name for name in profiles if not RSYNC_PROFILES[name]['ssh']]
+        print("Using a loopback shell: timings exclude ssh encryption")
+        loopback = rsh = os.path.join(args.workdir, "loopback-rsh")
+        with open(loopback, 'w') as f:
+            f.write(LOOPBACK_RSH)
+        os.chmod(loopback, 0o755)
+
+    print(f"{'shape':<7}{'profile':<24}{'pass':<13}{'MB/s':>9}{'files/s':>10}{'CPU s':>8}{'wall s':>8}")
+    recommended = {}
+    try:
+        for shape in args.shapes:
+            results = bench_shape(args.workdir, shape, args.size, profiles, rsh)
+            if results:
+                recommended[shape] = recommend(results)
+    finally:
+        if not args.keep:
+            for shape in args.shapes:
+                shutil.rmtree(os.path.join(args.workdir, f"src-{shape}"), ignore_errors=True)
+                shutil.rmtree(os.path.join(args.workdir, f"src-{shape}-changed"), ignore_errors=True)
+        if loopback:
+            os.remove(loopback)
+
+    print("\nRecommended profiles:")
+    for shape, profile in recommended.items():
+        print(f"  {shape:<7}{profile}")
+
+    for entry in args.save:
+        source_name, _, shape = entry.partition("=")
+        if shape not in recommended:
+            print(f"! No recommendation for shape '{shape}'")
+            continue
+        save_profile(args.config, source_name, recommended[shape])
+
+if __name__ == "__main__":
+    main()
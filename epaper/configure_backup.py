@@ -4,6 +4,8 @@
 import json
 from pathlib import Path
 
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
 def get_input(prompt, default=None):
     if default:
         user_input = input(f"{prompt} [{default}]: ").strip()
@@ -11,60 +13,17 @@ def get_input(prompt, default=None):
     return input(f"{prompt}: ").strip()
 
 def create_backup_script(config):
-    script_content = f"""#!/bin/bash
-
-# Backup Configuration
-BACKUP_SOURCES={json.dumps(config['backup_sources'])}
-BK0_PATH="{config['bk0_path']}"
-BK1_PATH="{config['bk1_path']}"
-STATUS_FILE="{config['status_file']}"
-
-RSYNC_OPTS="-aAXv --delete --numeric-ids --exclude={{'/dev/*','/proc/*','/sys/*','/tmp/*','/run/*','/mnt/*','/media/*','/lost+found'}}"
-
-update_status() {{
-    echo "$(date '+%Y-%m-%d %H:%M:%S') - $1" > "$STATUS_FILE"
-}}
-
-update_status "Starting backup"
-
-for source in "${{!BACKUP_SOURCES[@]}}"; do
-    source_config="${{BACKUP_SOURCES[$source]}}"
-    echo "Backing up $source..."
-    rsync $RSYNC_OPTS -e "ssh -p ${{source_config['port']}}" --rsync-path="sudo rsync" "${{source_config['user']}}@${{source_config['host']}}:${{source_config['path']}}" "$BK0_PATH/${{source_config['backup_dir']}}/"
-    
-    if [ $? -ne 0 ]; then
-        echo "$source backup failed!"
-        update_status "$source failed"
-        exit 1
-    fi
-done
-
-update_status "BK0 done"
-
-read -p "Update BK1? [y/N]: " confirm_bk1
-
-if [[ "$confirm_bk1" =~ ^[Yy]$ ]]; then
-    echo "Remounting BK1 rw..."
-    sudo mount -o remount,rw "$BK1_PATH"
+    """Save backup_config.json and generate backup.sh to run it with backup_runner.py."""
+    config_path = os.path.abspath('backup_config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=4)
 
-    echo "Syncing BK0 → BK1..."
-    rsync -av --delete "$BK0_PATH/" "$BK1_PATH/"
-
-    if [ $? -eq 0 ]; then
-        echo "BK1 done"
-        update_status "BK1 done"
-    else
-        echo "BK1 failed!"
-        update_status "BK1 failed"
-    fi
-
-    echo "Remounting BK1 ro..."
-    sudo mount -o remount,ro "$BK1_PATH"
-else
-    echo "BK1 skipped"
-fi
+    script_content = f"""#!/bin/bash
 
-update_status "Backup done"
+# Generated by configure_backup.py - edit backup_config.json to change sources.
+# Progress is checkpointed, so rerunning after a failure only redoes what is
+# left. Pass --fresh to back up every source again.
+exec "{sys.executable}" "{os.path.join(SCRIPT_DIR, 'backup_runner.py')}" --config "{config_path}" "$@"
 """
     
     with open('backup.sh', 'w') as f:
@@ -106,9 +65,9 @@ def main():
     
     print("\nConfiguration complete. Generating backup script...")
     create_backup_script(config)
-    print("Backup script generated as 'backup.sh'")
+    print("Backup script generated as 'backup.sh' (settings in 'backup_config.json')")
     print("\nNext steps:")
-    print("1. Review backup.sh")
+    print("1. Review backup_config.json")
     print("2. Set up SSH keys for remote servers")
     print("3. Run backup.sh manually or set up a cron job")
 
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import os
+import signal
+import threading
+import psutil
+
+PRESSURE_FILE = "/proc/pressure/io"
+
+# CPU priority of transfers, set once: without CAP_SYS_NICE it could not be raised again
+TRANSFER_NICE = 10
+# I/O priority while the box is idle, and while it is under pressure
+NORMAL_IOPRIO = (psutil.IOPRIO_CLASS_BE, 7)
+THROTTLED_IOPRIO = (psutil.IOPRIO_CLASS_IDLE, 0)
+
+def read_io_pressure(path=PRESSURE_FILE):
+    """Return the 10s average of the 'some' I/O pressure in percent, or None without PSI."""
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if fields and fields[0] == "some":
+                    return float(dict(field.split("=") for field in fields[1:])['avg10'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+def resolve_devices(paths):
+    """Map mount paths (e.g. BK0/BK1) to the disk names used by psutil.disk_io_counters."""
+    partitions = psutil.disk_partitions()
+    devices = []
+    for path in paths:
+        path = os.path.realpath(path)
+        matches = [p for p in partitions
+                   if path == p.mountpoint or path.startswith(p.mountpoint.rstrip("/") + "/")]
+        if not matches:
+            continue
+        device = os.path.basename(max(matches, key=lambda p: len(p.mountpoint)).device)
+        if device not in devices:
+            devices.append(device)
+    return devices
+
+def read_disk_counters(devices):
+    """Sum (ops, busy ms) over the given disks."""
+    counters = psutil.disk_io_counters(perdisk=True) or {}
+    ops = busy = 0
+    for device in devices:
+        c = counters.get(device)
+        if c:
+            ops += c.read_count + c.write_count
+            busy += c.read_time + c.write_time
+    return ops, busy
+
+def set_priority(pid, ioprio, nice=None):
+    """Apply I/O (and optionally CPU) priority to a process and all of its children (e.g. ssh)."""
+    try:
+        parent = psutil.Process(pid)
+        processes = [parent] + parent.children(recursive=True)
+    except psutil.Error:
+        return
+    for process in processes:
+        if nice is not None:
+            try:
+                process.nice(nice)
+            except psutil.Error:
+                pass
+        try:
+            process.ionice(*ioprio)
+        except psutil.Error:
+            pass
+
+class IOGovernor(threading.Thread):
+    """Keep foreground I/O latency under a target by throttling registered transfers.
+
+    Every interval the governor samples /proc/pressure/io and the average
+    per-request latency of the backup disks. Above target, each transfer's
+    share of wall time is halved; below, it grows back additively. The share
+    is enforced by SIGSTOP/SIGCONT on the transfer's process group, so a
+    running rsync is slowed without being respawned. This works with the
+    'none' scheduler NVMe drives usually run, where ionice alone has no effect.
+    """
+
+    def __init__(self, devices, target_latency_ms=20, target_pressure=10.0,
+                 min_share=0.1, interval=1.0):
+        super().__init__(daemon=True)
+        self.devices = devices
+        self.target_latency_ms = target_latency_ms
+        self.target_pressure = target_pressure
+        self.min_share = min_share
+        self.interval = interval
+        self.share = 1.0
+        self._pids = set()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._last_counters = read_disk_counters(devices)
+
+    def register(self, proc):
+        """Govern a transfer. The process must lead its own session (start_new_session=True)."""
+        set_priority(proc.pid, self._ioprio(), TRANSFER_NICE)
+        with self._lock:
+            self._pids.add(proc.pid)
+
+    def unregister(self, proc):
+        """Stop governing a transfer, making sure it is not left stopped."""
+        # _signal_all signals under the lock, so no SIGSTOP can follow this SIGCONT
+        with self._lock:
+            self._pids.discard(proc.pid)
+        self._signal_group(proc.pid, signal.SIGCONT)
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+
+    def _ioprio(self):
+        if self.share < 1.0:
+            return THROTTLED_IOPRIO
+        return NORMAL_IOPRIO
+
+    def _signal_group(self, pid, sig):
+        try:
+            os.killpg(pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _signal_all(self, sig):
+        with self._lock:
+            for pid in self._pids:
+                self._signal_group(pid, sig)
+
+    def sample_latency(self):
+        """Average ms per completed request on the governed disks since the last sample."""
+        ops, busy = read_disk_counters(self.devices)
+        last_ops, last_busy = self._last_counters
+        self._last_counters = (ops, busy)
+        if ops <= last_ops:
+            return 0.0
+        return (busy - last_busy) / (ops - last_ops)
+
+    def adjust(self):
+        """Update the transfer share from the current pressure and latency."""
+        pressure = read_io_pressure()
+        latency = self.sample_latency()
+        load = latency / self.target_latency_ms
+        if pressure is not None:
+            load = max(load, pressure / self.target_pressure)
+
+        was_throttled = self.share < 1.0
+        if load > 1.0:
+            self.share = max(self.min_share, self.share / 2)
+        elif load < 0.8:
+            self.share = min(1.0, self.share + 0.1)
+
+        if was_throttled != (self.share < 1.0):
+            print(f"I/O governor share {self.share:.2f} "
+                  f"(latency {latency:.1f} ms, pressure {pressure})")
+            with self._lock:
+                pids = list(self._pids)
+            for pid in pids:
+                set_priority(pid, self._ioprio())
+
+    def run(self):
+        try:
+            while not self._stopping.is_set():
+                self.adjust()
+                run_time = self.interval * self.share
+                self._signal_all(signal.SIGCONT)
+                if self._stopping.wait(run_time):
+                    break
+                if self.share < 1.0:
+                    self._signal_all(signal.SIGSTOP)
+                    self._stopping.wait(self.interval - run_time)
+        finally:
+            self._signal_all(signal.SIGCONT)
+
+def create_governor(config):
+    """Start an IOGovernor for the BK0/BK1 disks from backup_config.json, or None if disabled."""
+    options = dict(config.get('io_governor', {}))
+    if not options.pop('enabled', True):
+        return None
+    governor = IOGovernor(resolve_devices([config['bk0_path'], config['bk1_path']]), **options)
+    governor.start()
+    return governor
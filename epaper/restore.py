@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""Restore files of a backup source from BK0, or BK1 when BK0 is unhealthy.
+
+Paths are fnmatch-style globs relative to the source's backup directory; a
+matched directory is restored with everything below it. DEST is one of:
+
+    /local/dir          parallel file copy (copy_file_range, small files batched)
+    [user@]host:/path   tar stream over ssh, extracted on the host
+    -                   tar stream on stdout
+
+    python3 restore.py laptop 'home/pi/Documents/**' --to /tmp/restore
+    python3 restore.py laptop etc --to pi@laptop:/ --sudo
+"""
+import os
+import sys
+import json
+import stat
+import time
+import errno
+import shlex
+import shutil
+import fnmatch
+import itertools
+import argparse
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from backup_runner import SCRIPT_DIR, DONE, RUNNING, load_config
+
+# Files below this size are copied in batches so thread overhead stays small
+SMALL_FILE = 1 << 20
+BATCH_FILES = 256
+BATCH_BYTES = 64 << 20
+COPY_CHUNK = 64 << 20
+
+def log(message):
+    # stdout may be carrying the tar stream
+    print(message, file=sys.stderr)
+
+def on_mounted_volume(path):
+    """True if path lives on its own filesystem rather than the root one.
+
+    The backup path may be a directory inside the mount (e.g. /mnt/nvme0/backups);
+    if the drive is not mounted it falls through to the root filesystem.
+    """
+    try:
+        return os.stat(path).st_dev != os.stat("/").st_dev
+    except OSError:
+        return False
+
+def volume_healthy(volume, backup_dir, require_mount=True):
+    """A volume is usable if it is mounted, readable and holds the source's backup."""
+    root = os.path.join(volume, backup_dir)
+    try:
+        os.listdir(root)
+    except OSError:
+        return False
+    if require_mount and not on_mounted_volume(volume):
+        return False
+    return os.access(root, os.R_OK | os.X_OK)
+
+def source_entry(config, name):
+    try:
+        with open(config['checkpoint_file'], 'r') as f:
+            return json.load(f)['sources'][name]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def bk0_incomplete(entry):
+    """True if this run has written to the source's BK0 copy without finishing it."""
+    if entry is None or entry['state'] == DONE:
+        return False
+    # A pending or failed source that never moved a byte still has last night's copy
+    return entry['state'] == RUNNING or ('started' in entry and entry.get('bytes', 0) > 0)
+
+def pick_volume(config, source, choice):
+    """Return the backup root to restore from: BK0 if healthy, else BK1."""
+    volumes = {'bk0': config['bk0_path'], 'bk1': config['bk1_path']}
+    if choice != 'auto':
+        order = [choice]
+    else:
+        order = ['bk0', 'bk1']
+        entry = source_entry(config, source['name'])
+        if bk0_incomplete(entry):
+            # BK0 holds a half-finished sync of this source; BK1 has the last complete one
+            log(f"{source['name']} is '{entry['state']}' on BK0, preferring BK1")
+            order = ['bk1', 'bk0']
+    for name in order:
+        # An explicit --from is trusted even if the volume is not a separate mount
+        if volume_healthy(volumes[name], source['backup_dir'], require_mount=(choice == 'auto')):
+            log(f"Restoring from {name.upper()} ({volumes[name]})")
+            return os.path.join(volumes[name], source['backup_dir'])
+        log(f"{name.upper()} ({volumes[name]}) is not healthy")
+    return None
+
+def has_magic(part):
+    return any(c in part for c in "*?[")
+
+def match_paths(root, patterns):
+    """Yield relative paths matching the globs, walking only below their literal prefix."""
+    for pattern in patterns:
+        pattern = pattern.strip("/")
+        if not pattern:
+            yield "."
+            continue
+        parts = pattern.split("/")
+        prefix = []
+        for part in parts:
+            if has_magic(part):
+                break
+            prefix.append(part)
+        if len(prefix) == len(parts):
+            if os.path.lexists(os.path.join(root, pattern)):
+                yield pattern
+            continue
+        base = os.path.join(root, *prefix)
+        for dirpath, dirnames, filenames in os.walk(base):
+            for name in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, name), root)
+                if fnmatch.fnmatchcase(rel, pattern):
+                    yield rel
+            for name in list(dirnames):
+                rel = os.path.relpath(os.path.join(dirpath, name), root)
+                if fnmatch.fnmatchcase(rel, pattern):
+                    # The whole subtree is restored, no need to match inside it
+                    dirnames.remove(name)
+                    yield rel
+
+def collect(root, patterns):
+    """Yield (rel path, lstat) for every entry to restore as the walk finds it, parents first."""
+    seen = set()
+
+    def new(rel):
+        if rel in seen:
+            return False
+        seen.add(rel)
+        return rel != "."
+
+    for rel in match_paths(root, patterns):
+        # Parent directories are needed to place the match, with their metadata
+        parents = []
+        parent = os.path.dirname(rel)
+        while parent:
+            parents.append(parent)
+            parent = os.path.dirname(parent)
+        for path in reversed(parents):
+            if new(path):
+                yield path, os.lstat(os.path.join(root, path))
+        st = os.lstat(os.path.join(root, rel))
+        if new(rel):
+            yield rel, st
+        if stat.S_ISDIR(st.st_mode):
+            # Top-down: a directory is yielded before anything inside it
+            for dirpath, dirnames, filenames in os.walk(os.path.join(root, rel)):
+                for name in dirnames + filenames:
+                    path = os.path.relpath(os.path.join(dirpath, name), root)
+                    if new(path):
+                        yield path, os.lstat(os.path.join(root, path))
+
+def copy_data(src, dst, size):
+    """Copy file contents in the kernel: copy_file_range, falling back to sendfile."""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        copied = 0
+        try:
+            while copied < size:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(size - copied, COPY_CHUNK))
+                if n == 0:
+                    break
+                copied += n
+        except (AttributeError, OSError) as e:
+            # copy_file_range is missing before Python 3.8 and refused by some filesystems
+            if isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.ENOSYS,
+                                                          errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            while copied < size:
+                n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, min(size - copied, COPY_CHUNK))
+                if n == 0:
+                    break
+                copied += n
+    return copied
+
+def restore_owner(path, st):
+    if os.geteuid() == 0:
+        os.lchown(path, st.st_uid, st.st_gid)
+
+def restore_entry(root, dest, rel, st):
+    """Restore one file or symlink with its ownership, mode, times and xattrs."""
+    src = os.path.join(root, rel)
+    dst = os.path.join(dest, rel)
+    try:
+        # lstat: a symlink to a directory is replaced, never written through
+        if not stat.S_ISDIR(os.lstat(dst).st_mode):
+            os.unlink(dst)
+    except FileNotFoundError:
+        pass
+    if stat.S_ISLNK(st.st_mode):
+        os.symlink(os.readlink(src), dst)
+        restore_owner(dst, st)
+        os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+        return
+    if not stat.S_ISREG(st.st_mode):
+        log(f"! Skipping special file {rel}")
+        return
+    copy_data(src, dst, st.st_size)
+    # chown first: it clears setuid bits that copystat then puts back
+    restore_owner(dst, st)
+    shutil.copystat(src, dst)
+
+def restore_batch(root, dest, batch):
+    """Restore a batch of entries. Returns the number that failed."""
+    failed = 0
+    for rel, st in batch:
+        try:
+            restore_entry(root, dest, rel, st)
+        except OSError as e:
+            log(f"! {rel}: {e}")
+            failed += 1
+    return failed
+
+def make_batches(entries):
+    """Yield every large file as its own task and small ones in groups, as entries arrive."""
+    current, current_bytes = [], 0
+    for rel, st in entries:
+        if st.st_size >= SMALL_FILE:
+            yield [(rel, st)]
+            continue
+        current.append((rel, st))
+        current_bytes += st.st_size
+        if len(current) >= BATCH_FILES or current_bytes >= BATCH_BYTES:
+            yield current
+            current, current_bytes = [], 0
+    if current:
+        yield current
+
+def restore_local(root, entries, dest, jobs):
+    """Restore into a local directory with a pool of copy threads. Returns the number of failures.
+
+    Copying starts while the source is still being walked; at most a few
+    batches per thread are queued ahead of the pool.
+    """
+    dirs = []
+
+    def files():
+        for rel, st in entries:
+            if stat.S_ISDIR(st.st_mode):
+                # Parents come first, so the directory exists before its files are queued
+                os.makedirs(os.path.join(dest, rel), exist_ok=True)
+                dirs.append((rel, st))
+            else:
+                yield rel, st
+
+    os.makedirs(dest, exist_ok=True)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        queued = set()
+        for batch in make_batches(files()):
+            if len(queued) >= 2 * jobs:
+                done, queued = wait(queued, return_when=FIRST_COMPLETED)
+                failed += sum(future.result() for future in done)
+            queued.add(pool.submit(restore_batch, root, dest, batch))
+        failed += sum(future.result() for future in queued)
+
+    # Directory metadata last, deepest first, so copying into them does not bump mtimes
+    for rel, st in reversed(dirs):
+        path = os.path.join(dest, rel)
+        restore_owner(path, st)
+        shutil.copystat(os.path.join(root, rel), path)
+    return failed
+
+def restore_tar(root, entries, remote=None, port=22, sudo=False):
+    """Stream the entries as a tar to stdout, or over ssh into remote = (host, path).
+
+    The entries may be a generator: tar starts archiving the first names
+    while the rest of the tree is still being walked.
+    """
+    tar_cmd = ["tar", "-C", root, "--numeric-owner", "--acls", "--xattrs",
+               "--no-recursion", "--null", "-T", "-", "-cf", "-"]
+    if remote is None:
+        tar = subprocess.Popen(tar_cmd, stdin=subprocess.PIPE)
+        ssh = None
+    else:
+        host, path = remote
+        extract = (f"mkdir -p {shlex.quote(path)} && tar --numeric-owner --acls --xattrs "
+                   f"-xpf - -C {shlex.quote(path)}")
+        if sudo:
+            extract = f"sudo sh -c {shlex.quote(extract)}"
+        tar = subprocess.Popen(tar_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        ssh = subprocess.Popen(["ssh", "-p", str(port), host, extract], stdin=tar.stdout)
+        # Only ssh should hold the pipe, so it sees EOF when tar exits
+        tar.stdout.close()
+
+    try:
+        # Names go to tar as the walk finds them; fsencode round-trips the
+        # surrogate-escaped names os.walk gives non-UTF-8 files
+        for rel, _ in entries:
+            tar.stdin.write(os.fsencode(rel) + b"\0")
+    except BrokenPipeError:
+        pass  # tar exited early; its exit code says why
+    except BaseException:
+        for proc in (tar, ssh):
+            if proc:
+                proc.kill()
+        raise
+    finally:
+        try:
+            tar.stdin.close()
+        except BrokenPipeError:
+            pass
+        tar.wait()
+        if ssh:
+            ssh.wait()
+
+    returncode = tar.returncode
+    if ssh and ssh.returncode != 0:
+        returncode = returncode or ssh.returncode
+    return returncode
+
+def counted(entries, totals):
+    """Pass entries through, counting them and their file bytes into totals."""
+    for rel, st in entries:
+        totals['entries'] += 1
+        if stat.S_ISREG(st.st_mode):
+            totals['bytes'] += st.st_size
+        yield rel, st
+
+def parse_remote(dest):
+    """Split '[user@]host:/path' into (host, path), or None for a local path."""
+    host, sep, path = dest.partition(":")
+    if not sep or "/" in host:
+        return None
+    return host, path or "."
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog="\n".join(__doc__.splitlines()[2:]))
+    parser.add_argument("source", help="Backup source name from backup_config.json")
+    parser.add_argument("paths", nargs="*", default=[""], help="Globs relative to the backup (default: everything)")
+    parser.add_argument("--to", required=True, metavar="DEST", help="Local dir, [user@]host:/path or -")
+    parser.add_argument("--from", dest="volume", choices=("auto", "bk0", "bk1"), default="auto")
+    parser.add_argument("--jobs", type=int, default=8, help="Copy threads for local restores")
+    parser.add_argument("--port", help="SSH port (default: the source's port when restoring to its host)")
+    parser.add_argument("--sudo", action="store_true", help="Extract with sudo on the remote host")
+    parser.add_argument("--config", default=os.path.join(SCRIPT_DIR, "backup_config.json"))
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    source = next((s for s in config['backup_sources'] if s['name'] == args.source), None)
+    if source is None:
+        log(f"Unknown source: {args.source}")
+        sys.exit(1)
+
+    root = pick_volume(config, source, args.volume)
+    if root is None:
+        log("No healthy backup volume to restore from")
+        sys.exit(1)
+
+    entries = collect(root, args.paths)
+    first = next(entries, None)
+    if first is None:
+        log("Nothing matched")
+        sys.exit(1)
+    totals = {'entries': 0, 'bytes': 0}
+    entries = counted(itertools.chain([first], entries), totals)
+    log("Restoring...")
+
+    start = time.monotonic()
+    remote = parse_remote(args.to)
+    if args.to == "-":
+        returncode = restore_tar(root, entries)
+    elif remote:
+        port = args.port
+        if port is None:
+            port = source['port'] if remote[0].split("@")[-1] == source['host'] else 22
+        returncode = restore_tar(root, entries, remote, port, args.sudo)
+    else:
+        failed = restore_local(root, entries, args.to, args.jobs)
+        if failed:
+            log(f"! {failed} entries could not be restored")
+        returncode = 1 if failed else 0
+    elapsed = time.monotonic() - start
+
+    total = totals['bytes'] / (1 << 20)
+    log(f"Restored {totals['entries']} entries ({total:.1f} MB) in {elapsed:.1f}s "
+        f"({total / max(elapsed, 0.001):.1f} MB/s)")
+    sys.exit(returncode)
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,13 @@ import logging
 import time
 import psutil
 import os
+import io
+import hashlib
+import threading
 import subprocess
+from abc import ABC, abstractmethod
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import RPi.GPIO as GPIO
 from waveshare_epd import epd4in2_V2
 from PIL import Image, ImageDraw, ImageFont
@@ -14,6 +20,10 @@ logger = logging.getLogger(__name__)
 # Get the directory where the script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Where the rendered frame is published besides the e-paper panel
+FRAME_HTTP_PORT = 8080
+TERMINAL_FRAME_PATH = "/run/snapsync/frame.ans"
+
 # Initialize previous network counters
 prev_bytes_sent = 0
 prev_bytes_recv = 0
@@ -128,6 +138,184 @@ def draw_dithered_bar(draw, x, y, width, height, percentage):
     for i in range(x, x + bar_width, 2):  # Dithered effect
         draw.line([(i, y), (i, y + height)], fill=255)
 
+class EPaperSink:
+    """Show frames on the panel, with a full refresh after every few partial ones."""
+
+    def __init__(self, epd, partial_refresh_limit=20):
+        self.epd = epd
+        self.partial_refresh_limit = partial_refresh_limit
+        self.partial_refresh_count = 0
+
+    def submit(self, image, digest):
+        if self.partial_refresh_count < self.partial_refresh_limit:
+            self.epd.display_Partial(self.epd.getbuffer(image))
+            self.partial_refresh_count += 1
+        else:
+            # Perform a full refresh
+            self.epd.display(self.epd.getbuffer(image))
+            self.partial_refresh_count = 0
+
+class AsyncSink(ABC):
+    """Render frames on a worker thread so a slow sink never holds up the panel.
+
+    Only the latest frame is kept; frames that arrive while the worker is busy
+    replace each other instead of queueing up.
+    """
+
+    def __init__(self):
+        self._pending = None
+        self._condition = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, image, digest):
+        with self._condition:
+            self._pending = (image, digest)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                image, digest = self._pending
+                self._pending = None
+            try:
+                self.render(image, digest)
+            except Exception as e:
+                logger.error(f"{type(self).__name__} failed to render frame: {e}")
+
+    @abstractmethod
+    def render(self, image, digest):
+        """Publish one frame; runs on the sink's worker thread."""
+
+class FrameRequestHandler(BaseHTTPRequestHandler):
+    """Serve the latest frame as PNG, answering If-None-Match with 304."""
+
+    PAGE = (b'<!DOCTYPE html><html><head><title>SnapSync</title>'
+            b'<meta http-equiv="refresh" content="30"></head>'
+            b'<body style="background:#000"><img src="/frame.png" style="image-rendering:pixelated">'
+            b'</body></html>')
+
+    def do_GET(self):
+        # Ignore query strings such as cache-busters
+        path = urlsplit(self.path).path
+        if path == "/":
+            self._send(200, "text/html", self.PAGE)
+            return
+        if path != "/frame.png":
+            self._send(404, "text/plain", b"Not found")
+            return
+        png, etag = self.server.sink.latest()
+        if png is None:
+            self._send(503, "text/plain", b"No frame yet")
+            return
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self._send(200, "image/png", png, etag)
+
+    def _send(self, code, content_type, body, etag=None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+            # Revalidate every time; unchanged frames cost a 304
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class HTTPSink(AsyncSink):
+    """Encode changed frames to PNG and serve them over HTTP."""
+
+    def __init__(self, port=FRAME_HTTP_PORT):
+        self._png = None
+        self._etag = None
+        self._lock = threading.Lock()
+        server = ThreadingHTTPServer(("", port), FrameRequestHandler)
+        server.daemon_threads = True
+        server.sink = self
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        super().__init__()
+
+    def latest(self):
+        with self._lock:
+            return self._png, self._etag
+
+    def render(self, image, digest):
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+        with self._lock:
+            self._png = buffer.getvalue()
+            self._etag = f'"{digest}"'
+
+# Braille dot bit for each (x, y) offset in a 2x4 character cell
+BRAILLE_DOTS = ((0, 0, 0x01), (0, 1, 0x02), (0, 2, 0x04), (1, 0, 0x08),
+                (1, 1, 0x10), (1, 2, 0x20), (0, 3, 0x40), (1, 3, 0x80))
+
+def render_braille(image):
+    """Render a 1-bit frame as braille text, one character per 2x4 pixels."""
+    width, height = image.size
+    pixels = image.load()
+    lines = []
+    for y in range(0, height - height % 4, 4):
+        line = []
+        for x in range(0, width - width % 2, 2):
+            bits = 0
+            for dx, dy, bit in BRAILLE_DOTS:
+                if pixels[x + dx, y + dy]:
+                    bits |= bit
+            line.append(chr(0x2800 + bits))
+        lines.append("".join(line).rstrip("\u2800"))
+    return "\n".join(lines) + "\n"
+
+class TerminalSink(AsyncSink):
+    """Write changed frames as ANSI text for SSH sessions, e.g. `cat /run/snapsync/frame.ans`."""
+
+    def __init__(self, path=TERMINAL_FRAME_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        super().__init__()
+
+    def render(self, image, digest):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # Home the cursor and clear, so repeated `cat`s repaint in place
+            f.write("\x1b[H\x1b[2J" + render_braille(image))
+        os.replace(tmp_path, self.path)
+
+class FramePublisher:
+    """Fan one rendered frame out to every sink, skipping frames that did not change."""
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+        self._last_digest = None
+
+    def publish(self, image):
+        digest = hashlib.sha1(image.tobytes()).hexdigest()
+        if digest == self._last_digest:
+            return
+        self._last_digest = digest
+        # The caller keeps drawing into image; sinks get a snapshot
+        frame = image.copy()
+        for sink in self.sinks:
+            sink.submit(frame, digest)
+
+def create_publisher(epd):
+    """Publish to the panel first, then to the optional sinks that could be started."""
+    sinks = [EPaperSink(epd)]
+    for sink_class in (HTTPSink, TerminalSink):
+        try:
+            sinks.append(sink_class())
+        except OSError as e:
+            logger.error(f"Failed to start {sink_class.__name__}: {e}")
+    return FramePublisher(sinks)
+
 def display_stats(epd):
     """Draw system stats on the e-paper display with partial refresh."""
     # Initialize image and draw object
@@ -180,8 +368,7 @@ def display_stats(epd):
     epd.display(epd.getbuffer(image))
     epd.init()  # Re-initialize for partial updates
 
-    partial_refresh_count = 0
-    partial_refresh_limit = 20
+    publisher = create_publisher(epd)
 
     # Define regions for partial updates
     cpu_area = (bar_x, header_height + 27, value_x + 40, header_height + 47)
@@ -201,20 +388,11 @@ def display_stats(epd):
         draw.rectangle((label_x, backup_status_y, epd.width, backup_status_y + 20), fill=0)
         draw.text((label_x, backup_status_y), backup_status, font=font_small, fill=255)
 
-        if partial_refresh_count < partial_refresh_limit:
-            epd.display_Partial(epd.getbuffer(image))
-            partial_refresh_count += 1
-        else:
-            # Perform a full refresh
-            epd.display(epd.getbuffer(image))
-            partial_refresh_count = 0
-
         # Update CPU Bar and Value
         draw.rectangle(cpu_area, fill=0)  # Clear previous value
         draw_dithered_bar(draw, bar_x, cpu_area[1] + 3, bar_width, 12, stats["CPU"])
         draw.rectangle((value_x, cpu_area[1], value_x + 50, cpu_area[3]), fill=0)  # Clear previous text
         draw.text((value_x, cpu_area[1]), f"{stats['CPU']}%", font=font_small, fill=255)
-        epd.display_Partial(epd.getbuffer(image))  # Corrected method name
 
         # Update Root Disk Bar and Value
         used, total = stats["RootDisk"]
@@ -223,7 +401,6 @@ def display_stats(epd):
         draw_dithered_bar(draw, bar_x, root_area[1] + 3, bar_width, 12, disk_usage)
         draw.rectangle((value_x, root_area[1], value_x + 80, root_area[3]), fill=0)  # Clear previous text
         draw.text((value_x, root_area[1]), f"{used}/{total} GB", font=font_small, fill=255)
-        epd.display_Partial(epd.getbuffer(image))  # Corrected method name
 
         # Update BK0 Bar and Value
         used, total = stats["BK0"]
@@ -232,7 +409,6 @@ def display_stats(epd):
         draw_dithered_bar(draw, bar_x, bkp_area[1] + 3, bar_width, 12, disk_usage)
         draw.rectangle((value_x, bkp_area[1], value_x + 80, bkp_area[3]), fill=0)  # Clear previous text
         draw.text((value_x, bkp_area[1]), f"{used}/{total} GB", font=font_small, fill=255)
-        epd.display_Partial(epd.getbuffer(image))  # Corrected method name
 
         # Update BK1 Bar and Value
         used, total = stats["BK1"]
@@ -241,17 +417,17 @@ def display_stats(epd):
         draw_dithered_bar(draw, bar_x, imm_area[1] + 3, bar_width, 12, disk_usage)
         draw.rectangle((value_x, imm_area[1], value_x + 80, imm_area[3]), fill=0)  # Clear previous text
         draw.text((value_x, imm_area[1]), f"{used}/{total} GB", font=font_small, fill=255)
-        epd.display_Partial(epd.getbuffer(image))  # Corrected method name
 
         # Update Temperature below IMM
         draw.rectangle(temp_below_area, fill=0)  # Clear previous value
         draw.text((value_x, temp_below_area[1]), stats["Temp"], font=font_mono, fill=255)
-        epd.display_Partial(epd.getbuffer(image))  # Corrected method name
 
         # Update Network Load below IMM
         draw.rectangle(net_below_area, fill=0)  # Clear previous value
         draw.text((value_x, net_below_area[1]), stats["Network"], font=font_mono, fill=255)
-        epd.display_Partial(epd.getbuffer(image))  # Corrected method name
+
+        # One render, published to the panel and every other sink
+        publisher.publish(image)
 
         time.sleep(30)  # Update every 30 seconds
 